@@ -1,9 +1,15 @@
 #!/usr/bin/env python
 from plugins.modules.linkoverlay import MODULE_ARGS
-from yaml import safe_load, safe_dump
+from yaml import load, dump, SafeDumper
+# The C emitter wraps long scalars differently, so only loading uses libyaml
+# to keep the generated file identical on every machine
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 
-documented_keys = [
+documented_keys = frozenset((
     "description",
     "required",
     "default",
@@ -13,7 +19,9 @@ documented_keys = [
     "aliases",
     "version_added",
     "suboptions"
-]
+))
+
+doc_path = "plugins/modules/linkoverlay.yml"
 
 license_comment = (
     "# GNU General Public License v3.0+ "
@@ -32,13 +40,23 @@ if __name__ == "__main__":
     }
 
     with open("plugins/modules/linkoverlay.partial.yml") as doc_partial:
-        doc_yml = safe_load(doc_partial)
+        doc_yml = load(doc_partial, Loader=SafeLoader)
     doc_yml["DOCUMENTATION"]["options"] = docs
-    with open("plugins/modules/linkoverlay.yml", "w") as doc_file:
-        doc_string = safe_dump(
-            doc_yml,
-            None,
-            default_flow_style=False,
-            sort_keys=False
-        )
-        doc_file.write(license_comment + doc_string)
+    doc_string = license_comment + dump(
+        doc_yml,
+        None,
+        Dumper=SafeDumper,
+        default_flow_style=False,
+        sort_keys=False
+    )
+
+    # Leave the file (and its mtime) alone if nothing changed
+    try:
+        with open(doc_path) as doc_file:
+            old_doc_string = doc_file.read()
+    except FileNotFoundError:
+        old_doc_string = None
+
+    if doc_string != old_doc_string:
+        with open(doc_path, "w") as doc_file:
+            doc_file.write(doc_string)
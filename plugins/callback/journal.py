@@ -4,6 +4,8 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import atexit
+
 from ansible.plugins.callback import CallbackBase
 from ansible.executor.task_result import TaskResult
 from ansible.playbook.task import Task
@@ -15,6 +17,8 @@ from ansible.plugins.loader import PluginLoader
 
 from ansible.inventory.host import Host
 
+from typing import Dict, Optional, TextIO, Tuple
+
 DOCUMENTATION = """
     name: journal
     type: notification
@@ -25,6 +29,13 @@ DOCUMENTATION = """
         - "paths kept present by that task are appended to the given file."
 """
 
+# Journals are only written out when closed, so one write per task suffices
+# for all but very long journals
+JOURNAL_BUFFER_SIZE = 1 << 16
+
+# Variable, block and comment delimiters of Jinja
+JINJA_STARTS = ("{{", "{%", "{#")
+
 
 class CallbackModule(CallbackBase):
     CALLBACK_VERSION = 0.1
@@ -34,6 +45,31 @@ class CallbackModule(CallbackBase):
 
     def __init__(self, display=None):
         super(CallbackModule, self).__init__(display=display)
+        self._journals: Dict[str, TextIO] = {}
+        self._journal_paths: Dict[Tuple[str, str], Optional[str]] = {}
+        # Runs that end before the next task or the stats still get
+        # their buffered journal entries written
+        atexit.register(self._close_journals)
+
+    def _journal(self, journal_path: str) -> TextIO:
+        """Returns an open journal file, opening it on first use.
+        """
+        file = self._journals.get(journal_path)
+        if file is None:
+            file = self._journals[journal_path] = open(
+                journal_path, "a", buffering=JOURNAL_BUFFER_SIZE
+            )
+        return file
+
+    def _close_journals(self):
+        """Closes all journal files, so later tasks see complete journals
+        and journals removed by a task get recreated on the next write.
+        Journal paths looked up for the finished task are dropped as well.
+        """
+        for file in self._journals.values():
+            file.close()
+        self._journals.clear()
+        self._journal_paths.clear()
 
     def _all_vars(self, host: Host, task: Task):
         self.play: Play
@@ -43,6 +79,26 @@ class CallbackModule(CallbackBase):
             task=task
         )
 
+    def _journal_path(self, host: Host, task: Task) -> Optional[str]:
+        """Returns the templated journal_path of a task on a host.
+        Looked up once per task and host instead of once per loop item.
+        """
+        key = (task._uuid, host.get_name())
+        if key not in self._journal_paths:
+            path = task.get_vars().get("journal_path")
+            # Plain strings without Jinja delimiters need no templating
+            if path is not None and (
+                not isinstance(path, str)
+                or any(start in path for start in JINJA_STARTS)
+            ):
+                templar = Templar(
+                    loader=self.playbook.get_loader(),
+                    variables=self._all_vars(host=host, task=task)
+                )
+                path = templar.template(path)
+            self._journal_paths[key] = path
+        return self._journal_paths[key]
+
     def _write_result(self, journal_path: str, task: Task, result):
         if result.get("skipped", False):
             return
@@ -52,12 +108,12 @@ class CallbackModule(CallbackBase):
 
         path = result.get("dest", result.get("path"))
 
-        with open(journal_path, "a") as file:
-            if path is None:
-                task_name = task.get_name().replace("\n", "\\n")
-                file.write(f"!{task_name}: missing path argument\n")
-            else:
-                file.write(f"{path}\n")
+        file = self._journal(journal_path)
+        if path is None:
+            task_name = task.get_name().replace("\n", "\\n")
+            file.write(f"!{task_name}: missing path argument\n")
+        else:
+            file.write(f"{path}\n")
 
     def v2_runner_on_ok(self, result: TaskResult):
         super().v2_runner_on_ok(result)
@@ -68,16 +124,9 @@ class CallbackModule(CallbackBase):
         if "results" in task_result:  # loops get handled by v2_runner_item_*
             return
 
-        path = task.get_vars().get("journal_path")
-        if path is not None:
-            templar = Templar(
-                loader=self.playbook.get_loader(),
-                variables=self._all_vars(host=host, task=task)
-            )
-            expanded_path = templar.template(path)
-
-            if expanded_path is not None:
-                self._write_result(expanded_path, task, task_result)
+        journal_path = self._journal_path(host=host, task=task)
+        if journal_path is not None:
+            self._write_result(journal_path, task, task_result)
 
     def v2_playbook_on_start(self, playbook: Playbook):
         self.playbook = playbook
@@ -85,19 +134,22 @@ class CallbackModule(CallbackBase):
     def v2_playbook_on_play_start(self, play: Play):
         self.play = play
 
+    # Journals stay open for all results of a task
+    def v2_playbook_on_task_start(self, task: Task, is_conditional: bool):
+        self._close_journals()
+
+    def v2_playbook_on_handler_task_start(self, task: Task):
+        self._close_journals()
+
+    def v2_playbook_on_stats(self, stats):
+        self._close_journals()
+
     def v2_runner_item_on_ok(self, result: TaskResult):
         super().v2_runner_item_on_ok(result)
         task: Task = result._task
         host: Host = result._host
         task_result: dict = result._result
 
-        path = task.get_vars().get("journal_path")
-        if path is not None:
-            templar = Templar(
-                loader=self.playbook.get_loader(),
-                variables=self._all_vars(host=host, task=task)
-            )
-            expanded_path = templar.template(path)
-
-            if expanded_path is not None:
-                self._write_result(expanded_path, task, task_result)
+        journal_path = self._journal_path(host=host, task=task)
+        if journal_path is not None:
+            self._write_result(journal_path, task, task_result)
@@ -1,34 +1,55 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 import os
+import sys
 from os import path as osp
-from functools import reduce
-from typing import Dict, List, Optional, Callable
+from typing import Dict, List, Optional, Callable, Iterator
 from dataclasses import dataclass, field
-from operator import add
-from copy import deepcopy
+from contextlib import contextmanager
+from stat import S_ISDIR
 
 
 def exists(path: os.PathLike) -> bool:
     """Whether path exists.
     Symlinks - broken or not - are considered existing.
     """
-    return osp.exists(path) or osp.islink(path)
+    try:
+        os.lstat(path)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def stat_dir(path: os.PathLike) -> Optional[os.stat_result]:
+    """The lstat result of path, if it is a directory, else None.
+    Symlinks - regardless of their target - are not considered directories.
+    """
+    try:
+        stat = os.lstat(path)
+    except (OSError, ValueError):
+        return None
+    return stat if S_ISDIR(stat.st_mode) else None
 
 
 def isdir(path: os.PathLike) -> bool:
     """Whether path is a directory.
     Symlinks - regardless of their target - are not considered directories.
     """
-    return osp.isdir(path) and not osp.islink(path)
+    return stat_dir(path) is not None
 
 
 def is_inside(inner: os.PathLike, outer: os.PathLike) -> bool:
     """Whether inner is a path inside or equal to outer.
+    Both paths have to be absolute and normalized.
     """
-    inner = osp.abspath(inner)
-    outer = osp.abspath(outer)
-    return osp.commonpath([outer, inner]) == outer
+    return inner == outer or inner.startswith(outer.rstrip(os.sep) + os.sep)
+
+
+def link_target(link: os.PathLike) -> str:
+    """The absolute path a symlink points to.
+    Symlinks along the way are not resolved.
+    """
+    return osp.abspath(osp.join(osp.dirname(link), os.readlink(link)))
 
 
 def points_to(link: os.PathLike, path: os.PathLike) -> bool:
@@ -36,8 +57,7 @@ def points_to(link: os.PathLike, path: os.PathLike) -> bool:
     """
     if not osp.islink(link):
         return False
-    link_target = osp.join(osp.dirname(link), os.readlink(link))
-    return osp.abspath(link_target) == osp.abspath(path)
+    return link_target(link) == osp.abspath(path)
 
 
 def points_into(link: os.PathLike, path: os.PathLike) -> bool:
@@ -45,8 +65,7 @@ def points_into(link: os.PathLike, path: os.PathLike) -> bool:
     """
     if not osp.islink(link):
         return False
-    link_target = osp.join(osp.dirname(link), os.readlink(link))
-    return is_inside(link_target, path)
+    return is_inside(link_target(link), osp.abspath(path))
 
 
 def is_relative_link(link: os.PathLike) -> bool:
@@ -55,19 +74,76 @@ def is_relative_link(link: os.PathLike) -> bool:
     return osp.islink(link) and not osp.isabs(os.readlink(link))
 
 
-def equal_mode(a: os.PathLike, b: os.PathLike) -> bool:
+def walk_files(path: os.PathLike) -> Iterator[os.DirEntry]:
+    """Lazily yields DirEntries of all non-directories inside path.
+    Like the file names of os.walk, directories are judged following
+    symlinks, symlinks to directories are not recursed into and directories
+    that cannot be scanned are skipped.
+    """
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    yield entry
+                elif not entry.is_symlink():
+                    stack.append(entry.path)
+
+
+@contextmanager
+def open_dir(path: os.PathLike) -> Iterator[int]:
+    """Opens the directory path and yields its file descriptor.
+    The file descriptor is closed again on exit.
+    """
+    dir_fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        yield dir_fd
+    finally:
+        os.close(dir_fd)
+
+
+def equal_stats(
+    a: os.PathLike,
+    b: os.PathLike,
+    mode: bool = True,
+    owner: bool = True
+) -> bool:
+    """Whether a and b have the same mode and/or owner.
+    Symlinks are not followed and each path is stat'ed at most once.
+    """
+    if not mode and not owner:
+        return True
     a_stat = os.stat(a, follow_symlinks=False)
     b_stat = os.stat(b, follow_symlinks=False)
-    return a_stat.st_mode == b_stat.st_mode
+    return (
+        (not mode or a_stat.st_mode == b_stat.st_mode)
+        and (
+            not owner
+            or a_stat.st_uid == b_stat.st_uid
+            and a_stat.st_gid == b_stat.st_gid
+        )
+    )
+
+
+def equal_mode(a: os.PathLike, b: os.PathLike) -> bool:
+    return equal_stats(a, b, owner=False)
 
 
 def equal_owner(a: os.PathLike, b: os.PathLike) -> bool:
-    a_stat = os.stat(a, follow_symlinks=False)
-    b_stat = os.stat(b, follow_symlinks=False)
-    return a_stat.st_uid == b_stat.st_uid and a_stat.st_gid == b_stat.st_gid
+    return equal_stats(a, b, mode=False)
 
 
-@dataclass
+# Slots keep nodes small, but dataclasses only combine them with field
+# defaults from Python 3.10 on
+@dataclass(**({"slots": True} if sys.version_info >= (3, 10) else {}))
 class Tree():
     """A class representing a filesystem directory tree.
     This tree may or may not actually exist on the filesystem.
@@ -85,8 +161,10 @@ class Tree():
 
     @staticmethod
     def from_path(path: str, depth: Optional[int] = None) -> "Tree":
-        """Creates a tree recursively from an existing path.
+        """Creates a tree from an existing path.
         Symlinks are treated like files and are not recursed into.
+        Directories are scanned iteratively, taking the type of each child
+        from its DirEntry instead of inspecting every child path again.
         """
         if (
             depth is not None and depth < 0  # depth has to be positive
@@ -95,68 +173,94 @@ class Tree():
         ):
             raise AssertionError()
 
-        is_dir = isdir(path)
-
-        if is_dir and depth != 0:
-            child_depth = None if depth is None else depth - 1
-            children = [
-                Tree.from_path(child, child_depth)
-                for child
-                in map(lambda p: osp.join(path, p), os.listdir(path))
-            ]
-        else:
-            children = []
-
-        return Tree(
+        root = Tree(
             path=path,
-            children=children,
+            children=[],
             depth=depth,
-            props={"is_dir": is_dir}
+            props={"is_dir": isdir(path)}
         )
 
+        stack = [root]
+        while stack:
+            tree = stack.pop()
+            if not tree.props["is_dir"] or tree.depth == 0:
+                continue
+
+            child_depth = None if tree.depth is None else tree.depth - 1
+            with os.scandir(tree.path) as entries:
+                for entry in entries:
+                    child = Tree(
+                        path=entry.path,
+                        children=[],
+                        depth=child_depth,
+                        props={"is_dir": entry.is_dir(follow_symlinks=False)}
+                    )
+                    tree.children.append(child)
+                    stack.append(child)
+
+        return root
+
     def set_prop(self, key, value) -> None:
         self.props[key] = value
 
+    def set_prop_children(self, key, value) -> None:
+        """Like set_prop, but sets the prop on all children of self
+        recursively.
+        """
+        for tree in self.walk_children():
+            tree.props[key] = value
+
     def apply(self, func: Callable, stopping: bool = False) -> None:
         """Applies a function to this tree and all its children recursively.
         If stopping is True, stops recursing once func returns False.
         """
-        ret = func(self)
-        if stopping and not isinstance(ret, bool):
-            raise AssertionError()
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            ret = func(tree)
+            if stopping and not isinstance(ret, bool):
+                raise AssertionError()
 
-        if not stopping or ret:
-            for child in self.children:
-                child.apply(func, stopping)
+            if not stopping or ret:
+                stack.extend(reversed(tree.children))
 
     def apply_reverse(self, func: Callable) -> None:
         """Like apply, but applies func to children first, then self.
         """
-        for child in self.children:
-            child.apply_reverse(func)
-        func(self)
+        stack = [(self, False)]
+        while stack:
+            tree, visited = stack.pop()
+            if visited:
+                func(tree)
+            else:
+                stack.append((tree, True))
+                stack.extend(
+                    (child, False) for child in reversed(tree.children)
+                )
+
+    def walk(self) -> Iterator["Tree"]:
+        """Lazily yields this tree and all its children recursively.
+        """
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            yield tree
+            stack.extend(reversed(tree.children))
 
     def filter(self, func: Callable) -> List["Tree"]:
         """Returns a list of all trees in self where func returns True.
         """
-        matching = []
-        if func(self):
-            matching.append(self)
-        return matching + reduce(
-            add,
-            (child.filter(func) for child in self.children),
-            []
-        )
+        return [tree for tree in self.walk() if func(tree)]
 
     def all(self, func: Callable) -> bool:
         """True, if func returns true for this tree and all of its children.
         """
-        return func(self) and all(child.all(func) for child in self.children)
+        return all(func(tree) for tree in self.walk())
 
     def any(self, func: Callable) -> bool:
         """True, if func returns true for this tree or any of its children.
         """
-        return func(self) or any(child.any(func) for child in self.children)
+        return any(func(tree) for tree in self.walk())
 
     def apply_children(self, func: Callable, stopping: bool = False) -> None:
         """Like apply, but only applies to children of self.
@@ -170,24 +274,26 @@ class Tree():
         for child in self.children:
             child.apply_reverse(func)
 
+    def walk_children(self) -> Iterator["Tree"]:
+        """Like walk, but only yields children of self.
+        """
+        for child in self.children:
+            yield from child.walk()
+
     def filter_children(self, func: Callable) -> List["Tree"]:
         """Like filter, but only filters children of self.
         """
-        return reduce(
-            add,
-            (child.filter(func) for child in self.children),
-            []
-        )
+        return [tree for tree in self.walk_children() if func(tree)]
 
     def all_children(self, func: Callable) -> bool:
         """Like all, but only inspects children of self.
         """
-        return all(child.all(func) for child in self.children)
+        return all(func(tree) for tree in self.walk_children())
 
     def any_children(self, func: Callable) -> bool:
         """Like any, but only inspects children self.
         """
-        return any(child.any(func) for child in self.children)
+        return any(func(tree) for tree in self.walk_children())
 
     def translate_path(self, old_base: str, new_base: str) -> str:
         """Translates the path of this tree from one base directory to another.
@@ -203,13 +309,41 @@ class Tree():
         return osp.join(new_base, osp.relpath(self.path, old_base))
 
     def translate(self, old_base: str, new_base: str) -> "Tree":
-        """Replaces the paths of this tree recursively via translate_path.
+        """Returns a copy of this tree with paths translated like by
+        translate_path, but normalized, even for unnormalized bases.
         The original path is kept in props["original_path"].
         """
-        def substitute(tree: Tree):
-            tree.set_prop("original_path", tree.path)
-            tree.path = tree.translate_path(old_base, new_base)
+        def copy(tree: Tree, path: str) -> Tree:
+            return Tree(
+                path=path,
+                children=[],
+                depth=tree.depth,
+                props={**tree.props, "original_path": tree.path}
+            )
 
-        translated = deepcopy(self)
-        translated.apply(substitute)
-        return translated
+        # The root is validated by translate_path, but its path is built by
+        # swapping the normalized bases. Children are below the root and
+        # swap the root's path instead, so no path can disagree with another.
+        self.translate_path(old_base, new_base)
+        old_base = osp.normpath(old_base).rstrip(os.sep)
+        new_base = osp.normpath(new_base).rstrip(os.sep)
+        path = osp.normpath(self.path)
+        if not is_inside(path, old_base or os.sep):
+            raise AssertionError()
+        root = copy(self, new_base + path[len(old_base):] or os.sep)
+
+        old_prefix = self.path.rstrip(os.sep)
+        new_prefix = root.path.rstrip(os.sep)
+
+        stack = [(self, root)]
+        while stack:
+            tree, translation = stack.pop()
+            for child in tree.children:
+                if not child.path.startswith(old_prefix + os.sep):
+                    raise AssertionError()
+                child_translation = copy(
+                    child, new_prefix + child.path[len(old_prefix):]
+                )
+                translation.children.append(child_translation)
+                stack.append((child, child_translation))
+        return root
@@ -76,7 +76,8 @@ def mark_excluded(tree: Tree, exclude: Set[str]):
     """
     def impl(tree: Tree) -> bool:
         if tree.path in exclude:
-            tree.apply(lambda t: t.set_prop("excluded", True))
+            tree.set_prop("excluded", True)
+            tree.set_prop_children("excluded", True)
             return False  # Stop recursing
         else:
             tree.set_prop("excluded", False)
@@ -89,9 +90,12 @@ def mark_removable(tree: Tree):
     """Marks trees that are not and do not contain excluded trees.
     """
     def impl(tree: Tree):
-        tree.set_prop("removable", not tree.any(lambda t: t.props["excluded"]))
+        # Children are marked first, so only look one level down
+        tree.set_prop("removable", not tree.props["excluded"] and all(
+            child.props["removable"] for child in tree.children
+        ))
 
-    tree.apply_children(impl, stopping=False)
+    tree.apply_reverse_children(impl)
 
 
 def mark_remove(tree: Tree):
@@ -100,7 +104,7 @@ def mark_remove(tree: Tree):
     def impl(tree: Tree) -> bool:
         if tree.props["removable"]:
             tree.set_prop("remove", True)
-            tree.apply_children(lambda t: t.set_prop("remove", False))
+            tree.set_prop_children("remove", False)
             return False  # Stop recursing
         else:
             tree.set_prop("remove", False)
@@ -129,6 +133,10 @@ def main():
         message = "\n".join(errors)
         module.fail_json(msg=f"Journal contains errors:\n{message}")
 
+    # Normalize paths once, so excluded trees are found by string lookups
+    path = osp.abspath(path)
+    exclude = {osp.abspath(line) for line in exclude}
+
     # Build directory tree
     tree = Tree.from_path(path)
 
@@ -146,12 +154,28 @@ def main():
     if module.check_mode:
         module.exit_json(**result)
 
-    # Remove marked trees
-    for tree in remove:
-        if osp.islink(tree) or osp.isfile(tree):
-            os.unlink(tree)
-        else:
-            rmtree(tree)
+    # Remove marked trees, reusing the scanned tree instead of rescanning
+    # it like rmtree would. Children come before their parents.
+    def remove_tree(tree: Tree):
+        try:
+            if tree.props["is_dir"]:
+                os.rmdir(tree)
+            else:
+                os.unlink(tree)
+        except FileNotFoundError:
+            pass  # Already gone
+        except OSError:
+            # Changed since scanning, e.g. a directory got new content
+            if osp.islink(tree) or not osp.isdir(tree):
+                os.unlink(tree)
+            else:
+                rmtree(tree)
+
+    try:
+        for tree in remove:
+            tree.apply_reverse(remove_tree)
+    except OSError as error:
+        module.fail_json(msg=f"Error occured: {str(error)}", **result)
 
     module.exit_json(**result)
 
@@ -11,7 +11,8 @@ import os
 from os import path as osp
 from datetime import datetime
 import shutil
-from typing import List, Dict
+from stat import S_IMODE, S_ISLNK
+from typing import List, Dict, Optional
 
 try:
     from ansible_collections.rcx_one.linkoverlay.plugins.module_utils.\
@@ -80,6 +81,9 @@ MODULE_ARGS = {
         "description": [
             "Conflicting files will be backed up to this directory.",
 
+            "Conflicting files and directories are moved there as a whole, "
+            + "keeping their path relative to base_dir.",
+
             "If conflict is not set to C(replace), this has no effect.",
 
             "If not set, no backups will be made.",
@@ -108,19 +112,26 @@ MODULE_ARGS = {
     },
 }
 
+# MODULE_ARGS without the descriptions, which AnsibleModule does not accept
+ARGUMENT_SPEC = {
+    argument: {
+        key: val
+        for key, val in spec.items()
+        if key != "description"
+    }
+    for argument, spec in MODULE_ARGS.items()
+}
+
+# Whether the mode and owner of symlinks themselves can be changed
+CHMOD_SYMLINKS = os.chmod in os.supports_follow_symlinks
+CHOWN_SYMLINKS = os.chown in os.supports_follow_symlinks
+
 
 def setup_module():
     """Creates an AnsibleModule instance from MODULE_ARGS.
     """
     return AnsibleModule(
-        argument_spec={
-            argument: {
-                key: val
-                for key, val in spec.items()
-                if key != "description"
-            }
-            for argument, spec in MODULE_ARGS.items()
-        },
+        argument_spec=ARGUMENT_SPEC,
         supports_check_mode=True
     )
 
@@ -132,37 +143,43 @@ def validate_params(module: AnsibleModule, result: Dict):
     overlay_dir = module.params["overlay_dir"]
     backup_dir = module.params["backup_dir"]
 
-    if not util.isdir(base_dir):
+    base_stat = util.stat_dir(base_dir)
+    if base_stat is None:
         module.fail_json(
             msg="base_dir has to exist and be a directory", **result
         )
 
-    if not util.isdir(overlay_dir):
+    overlay_stat = util.stat_dir(overlay_dir)
+    if overlay_stat is None:
         module.fail_json(
             msg="overlay_dir has to exist and be a directory", **result
         )
 
     if (
-        osp.samefile(base_dir, overlay_dir)
-        or util.is_inside(base_dir, overlay_dir)
+        util.is_inside(base_dir, overlay_dir)
+        # Catches aliases through symlinked parents or bind mounts.
+        # Neither is a symlink, so their lstat results can be compared.
+        or osp.samestat(base_stat, overlay_stat)
     ):
         module.fail_json(
             msg="base_dir must not be (inside) overlay_dir", **result
         )
 
-    if backup_dir and util.exists(backup_dir) and not util.isdir(backup_dir):
+    backup_exists = backup_dir and util.exists(backup_dir)
+
+    if backup_exists and not util.isdir(backup_dir):
         module.fail_json(
             msg="backup_dir has to be a directory", **result
         )
 
-    if (
-        backup_dir
-        and util.exists(backup_dir)
-        and len(os.listdir(backup_dir)) > 0
-    ):
-        module.fail_json(
-            msg="backup_dir must be empty", **result
-        )
+    if backup_exists:
+        # Only the first entry is needed to tell that it is not empty
+        with os.scandir(backup_dir) as entries:
+            empty = next(entries, None) is None
+        if not empty:
+            module.fail_json(
+                msg="backup_dir must be empty", **result
+            )
 
     if backup_dir and util.is_inside(backup_dir, overlay_dir):
         module.fail_json(
@@ -170,33 +187,80 @@ def validate_params(module: AnsibleModule, result: Dict):
         )
 
 
-def mark_symlinked(translation: Tree):
-    """Marks children if one of their parents is a symlink
+def mark_existing(translation: Tree):
+    """Marks trees that exist in the base dir and records their link targets.
+    Every base dir is scanned once through a dir fd instead of per child
     """
-    def impl(tree: Tree) -> bool:
-        tree.set_prop("symlinked", False)
-        if osp.islink(tree):
-            tree.apply_children(lambda t: t.set_prop("symlinked", True))
-            return False  # Stop recursing
+    translation.set_prop("exists", True)
+    translation.set_prop("is_link", False)
+    translation.set_prop("link_target", None)
+
+    def set_link(tree: Tree, link: Optional[str]):
+        tree.set_prop("is_link", link is not None)
+        if link is not None:
+            tree.set_prop("link_target", osp.abspath(
+                osp.join(osp.dirname(tree.path), link)
+            ))
+            tree.set_prop("is_relative_link", not osp.isabs(link))
         else:
-            return True  # Recurse into children
+            tree.set_prop("link_target", None)
 
-    translation.apply_children(impl, stopping=True)
+    def impl(tree: Tree):
+        if not tree.children:
+            return
+
+        try:
+            if not tree.props["exists"]:
+                raise FileNotFoundError()
+            with util.open_dir(tree) as dir_fd, os.scandir(dir_fd) as it:
+                entries = {entry.name: entry for entry in it}
+                links = {}
+                for child in tree.children:
+                    name = osp.basename(child.path)
+                    if name in entries and entries[name].is_symlink():
+                        links[name] = os.readlink(name, dir_fd=dir_fd)
+        except (FileNotFoundError, NotADirectoryError):
+            # Children can not exist either
+            for child in tree.children:
+                child.set_prop("exists", False)
+                set_link(child, None)
+        except OSError:
+            # Fall back to inspecting children one by one
+            for child in tree.children:
+                child.set_prop("exists", util.exists(child))
+                set_link(
+                    child,
+                    os.readlink(child) if osp.islink(child) else None
+                )
+        else:
+            for child in tree.children:
+                name = osp.basename(child.path)
+                child.set_prop("exists", name in entries)
+                set_link(child, links.get(name))
+
+    translation.apply(impl)
 
 
 def mark_overlaid(translation: Tree, relative_links: bool):
-    """Marks trees that are already linked to the correct overlay file
-    and adhere to the specified relative_links value.
+    """Marks children if one of their parents is a symlink and trees that are
+    already linked to the correct overlay file and adhere to the specified
+    relative_links value.
     """
+    def set_symlinked(tree: Tree):
+        tree.set_prop("symlinked", True)
+        # Children have to be behind symlink -> consider them not overlaid
+        tree.set_prop("overlaid", False)
+
     def impl(tree: Tree) -> bool:
-        if tree.props["symlinked"]:
-            tree.apply(lambda t: t.set_prop("overlaid", False))
-            return False  # Stop recursing
-        elif util.points_to(tree, tree.props["original_path"]):
-            tree.set_prop("overlaid", util.is_relative_link(
-                tree) == relative_links)
-            # Children have to be behind symlink -> consider them not overlaid
-            tree.apply_children(lambda t: t.set_prop("overlaid", False))
+        tree.set_prop("symlinked", False)
+        if tree.props["is_link"]:
+            tree.set_prop(
+                "overlaid",
+                # Both paths are absolute and normalized already
+                tree.props["link_target"] == tree.props["original_path"]
+                and tree.props["is_relative_link"] == relative_links
+            )
+            tree.apply_children(set_symlinked)
             return False  # Stop recursing
         else:
             tree.set_prop("overlaid", False)
@@ -205,41 +269,27 @@ def mark_overlaid(translation: Tree, relative_links: bool):
     translation.apply_children(impl, stopping=True)
 
 
-def mark_broken(translation: Tree, overlay: Tree):
-    """Marks symlinks that point to an incorrect overlay file.
+def mark_conflicting(translation: Tree, overlay: Tree):
+    """Marks symlinks that point to an incorrect overlay file,
+    trees that have to be removed to create a complete overlay
+    and directories that are already correctly linked.
     """
     def impl(tree: Tree):
-        tree.set_prop(
-            "broken", (
-                not tree.props["symlinked"]
-                and util.points_into(tree, overlay)
-                and not tree.props["overlaid"]
-            )
+        broken = (
+            not tree.props["symlinked"]
+            and tree.props["link_target"] is not None
+            and util.is_inside(tree.props["link_target"], overlay.path)
+            and not tree.props["overlaid"]
         )
-
-    translation.apply_children(impl)
-
-
-def mark_conflicting(translation: Tree):
-    """Marks trees that have to be removed to create a complete overlay.
-    """
-    def impl(tree: Tree):
+        tree.set_prop("broken", broken)
         tree.set_prop(
             "conflicting",
             not tree.props["symlinked"]
-            and util.exists(tree)
+            and tree.props["exists"]
             and not tree.props["is_dir"]
             and not tree.props["overlaid"]
-            and not tree.props["broken"]
+            and not broken
         )
-
-    translation.apply_children(impl)
-
-
-def mark_collapsed(translation: Tree):
-    """Marks directories that are already correctly linked.
-    """
-    def impl(tree: Tree):
         tree.set_prop(
             "collapsed",
             tree.props["is_dir"] and tree.props["overlaid"]
@@ -248,33 +298,87 @@ def mark_collapsed(translation: Tree):
     translation.apply_children(impl)
 
 
-def mark_collapsible(translation: Tree, replace: bool, overlay: Tree):
+def mark_collapsible(
+        translation: Tree,
+        collapse: bool,
+        replace: bool,
+        overlay: Tree
+):
     """Marks directories that do not contain conflicting files and could
     therefore be replaced by a symlink into the overlay.
+    Without collapse, nothing is collapsed and the base dir is not scanned.
     """
+    if not collapse:
+        translation.set_prop_children("collapsible", False)
+        return
+
+    # A file inside a directory can only be a tree in its subtree,
+    # so a single set of all paths can be shared by every directory
+    paths = {t.path for t in translation.walk()} if replace else set()
+    # Link targets are read once, either by mark_existing or on first use
+    link_targets = {
+        t.path: t.props["link_target"]
+        for t in translation.walk()
+        if t.props["is_link"]
+    }
+
+    def points_into_overlay(entry: os.DirEntry) -> bool:
+        if not entry.is_symlink():
+            return False
+        if entry.path not in link_targets:
+            link_targets[entry.path] = util.link_target(entry.path)
+        return util.is_inside(link_targets[entry.path], overlay.path)
+
+    def replaceable_file(entry: os.DirEntry) -> bool:
+        return points_into_overlay(entry) or entry.path in paths
+
+    # Whether all files inside a base directory are replaceable.
+    # Computed for the directories of the tree from the bottom up, so each
+    # of them is scanned once instead of once per collapse candidate above.
+    replaceable = {}
+
+    def replaceable_entry(entry: os.DirEntry) -> bool:
+        # Judge entries like walk_files does
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+
+        if not is_dir:
+            return replaceable_file(entry)
+        elif entry.is_symlink():
+            return True
+        elif entry.path in replaceable:
+            return replaceable[entry.path]
+        else:
+            return all(
+                replaceable_file(file) for file in util.walk_files(entry.path)
+            )
+
+    def mark_replaceable(tree: Tree):
+        if not tree.props["is_dir"] or not tree.props["exists"]:
+            return
+        try:
+            entries = os.scandir(tree)
+        except OSError:
+            replaceable[tree.path] = True  # Skipped like in walk_files
+            return
+        with entries:
+            replaceable[tree.path] = all(
+                replaceable_entry(entry) for entry in entries
+            )
+
+    translation.apply_reverse_children(mark_replaceable)
+
     def impl(tree: Tree) -> bool:
         collapsible = (
             not tree.props["symlinked"]
             and tree.props["is_dir"]
             and (not tree.props["conflicting"] or replace)
         )
-        if collapsible and osp.exists(tree):
-            def replaceable(dir_path, file_names):
-                paths = (osp.join(dir_path, name) for name in file_names)
-                return all(
-                    util.isdir(path)
-                    or util.points_into(path, overlay)
-                    or replace and tree.any(
-                        lambda t: t.path == osp.abspath(path)
-                    )
-
-                    for path in paths
-                )
-
-            collapsible = all(
-                replaceable(dir_path, file_names)
-                for dir_path, dir_names, file_names in os.walk(tree)
-            )
+        if collapsible:
+            # Missing directories contain nothing that has to be replaced
+            collapsible = replaceable.get(tree.path, True)
 
         if collapsible:
             tree.apply(
@@ -291,14 +395,20 @@ def mark_collapsible(translation: Tree, replace: bool, overlay: Tree):
 def mark_removable(translation: Tree, collapse: bool, replace: bool):
     """Marks trees that are allowed to be removed.
     For linking to work, none of these files may remain in the base tree.
+    The topmost removable trees are also marked to be recursively removed,
+    their children are implicitly removed with them.
     """
+    def set_removable(tree: Tree):
+        tree.set_prop("removable", True)
+        tree.set_prop("remove", False)
+
     def impl(tree: Tree) -> bool:
         removable = (
             tree.props["broken"]
             or
             collapse
             and tree.props["collapsible"]
-            and util.exists(tree)
+            and tree.props["exists"]
             and not tree.props["collapsed"]
             or
             not collapse
@@ -307,29 +417,12 @@ def mark_removable(translation: Tree, collapse: bool, replace: bool):
             replace
             and tree.props["conflicting"]
         )
+        tree.set_prop("removable", removable)
+        tree.set_prop("remove", removable)
         if removable:
-            tree.set_prop("removable", True)
-            tree.apply_children(lambda t: t.set_prop("removable", True))
-            return False  # Stop recursing
-        else:
-            tree.set_prop("removable", False)
-            return True  # Recurse into children
-
-    translation.apply_children(impl, stopping=True)
-
-
-def mark_remove(translation: Tree):
-    """Marks trees that will be recursively removed.
-    Children of removed trees are not marked, because they are implicitly
-    removed with their parents.
-    """
-    def impl(tree: Tree) -> bool:
-        if tree.props["removable"]:
-            tree.set_prop("remove", True)
-            tree.apply_children(lambda t: t.set_prop("remove", False))
+            tree.apply_children(set_removable)
             return False  # Stop recursing
         else:
-            tree.set_prop("remove", False)
             return True  # Recurse into children
 
     translation.apply_children(impl, stopping=True)
@@ -350,7 +443,7 @@ def mark_link(translation: Tree, collapse: bool):
         )
         if link and (not tree.props["is_dir"] or collapse and collapsible):
             tree.set_prop("link", True)
-            tree.apply_children(lambda t: t.set_prop("link", False))
+            tree.set_prop_children("link", False)
             return False  # Stop recursing
         else:
             tree.set_prop("link", False)
@@ -362,39 +455,42 @@ def mark_link(translation: Tree, collapse: bool):
 def mark_stat(translation: Tree):
     """Marks trees that need matching mode and owner.
     """
+    def mark_contains_links(tree: Tree):
+        tree.set_prop("contains_links", any(
+            child.props["link"]
+            or child.props["overlaid"]
+            or child.props["contains_links"]
+            for child in tree.children
+        ))
+
+    # Computed bottom-up once instead of searching each directory's subtree
+    translation.apply_reverse_children(mark_contains_links)
+
     def impl(tree: Tree) -> bool:
         if tree.props["link"] or tree.props["overlaid"]:
             # Handle symlink stats
-            matches = (
-                util.exists(tree)
-                and (
-                    os.chmod not in os.supports_follow_symlinks
-                    or util.equal_mode(tree.path, tree.props["original_path"])
-                )
-                and (
-                    os.chown not in os.supports_follow_symlinks
-                    or util.equal_owner(tree.path, tree.props["original_path"])
-                )
-            )
             tree.set_prop(
                 "stat",
                 tree.props["link"]  # New links are always adjusted
-                or not matches
+                or not util.equal_stats(
+                    tree.path,
+                    tree.props["original_path"],
+                    mode=CHMOD_SYMLINKS,
+                    owner=CHOWN_SYMLINKS
+                )
             )
-            tree.apply_children(lambda t: t.set_prop("stat", False))
+            tree.set_prop_children("stat", False)
             return False  # Stop recursing
         else:
             # Handle directory stats
-            matches = (
-                util.exists(tree)
-                and util.equal_mode(tree.path, tree.props["original_path"])
-                and util.equal_owner(tree.path, tree.props["original_path"])
-            )
             tree.set_prop(
                 "stat",
-                not matches
-                and tree.any_children(
-                    lambda t: t.props["link"] or t.props["overlaid"]
+                tree.props["contains_links"]
+                and not (
+                    tree.props["exists"]
+                    and util.equal_stats(
+                        tree.path, tree.props["original_path"]
+                    )
                 )
             )
             return True  # Recurse into children
@@ -435,7 +531,7 @@ def update_result(
     result["removed_trees"] = [tree.path for tree in remove]
     result["created_links"] = [tree.path for tree in link]
     result["changed_stats"] = [tree.path for tree in stat]
-    result["changed"] = not (len(remove) == len(link) == len(stat) == 0)
+    result["changed"] = bool(remove or link or stat)
 
     if backup_dir:
         backup_list = [
@@ -453,24 +549,18 @@ def remove_trees(
 ):
     """Removes paths listed in `remove`.
     """
+    backup_parents = set()
     for tree in remove:
         if tree.props["conflicting"] and backup_dir:
             backup_path = tree.translate_path(base_dir, backup_dir)
-            os.makedirs(osp.dirname(backup_path), exist_ok=True)
-
-            def cptree(tree: Tree) -> bool:
-                """shutil.copytree replacement, because that breaks when it
-                encounters broken symlinks.
-                """
-                if osp.islink(tree) or osp.isfile(tree):
-                    shutil.copy2(tree, backup_path, follow_symlinks=False)
-                else:
-                    os.makedirs(tree, exist_ok=True)
-                # Recurse into children if tree is not a symlink
-                return not osp.islink(tree)
-            tree.apply(cptree, stopping=True)
-
-        if osp.islink(tree) or osp.isfile(tree):
+            backup_parent = osp.dirname(backup_path)
+            if backup_parent not in backup_parents:
+                os.makedirs(backup_parent, exist_ok=True)
+                backup_parents.add(backup_parent)
+            # A single rename on the same filesystem, otherwise symlinks are
+            # copied as symlinks before the original is removed
+            shutil.move(tree.path, backup_path)
+        elif osp.islink(tree) or osp.isfile(tree):
             os.unlink(tree)
         else:
             shutil.rmtree(tree)
@@ -480,28 +570,59 @@ def create_links(link: List[Tree], relative_links: bool):
     """Creates symlinks specified in `link`.
     The links are relative or absolute depending on `relative_links`.
     """
+    # Group links by directory, so each one is only created and opened once
+    directories: Dict[str, List[Tree]] = {}
     for tree in link:
-        os.makedirs(osp.dirname(tree), exist_ok=True)
-        target = tree.props["original_path"]
+        directories.setdefault(osp.dirname(tree.path), []).append(tree)
+
+    for directory, trees in directories.items():
+        # Targets of one directory share their overlay directory as well,
+        # so the relative path to it only has to be computed once
+        target_dir = osp.dirname(trees[0].props["original_path"])
         if relative_links:
-            target = osp.relpath(target, osp.dirname(tree))
-        os.symlink(target, tree)
+            target_dir = osp.relpath(target_dir, directory)
+
+        os.makedirs(directory, exist_ok=True)
+        with util.open_dir(directory) as dir_fd:
+            for tree in trees:
+                name = osp.basename(tree.path)
+                os.symlink(osp.join(target_dir, name), name, dir_fd=dir_fd)
 
 
 def change_stats(stat: List[Tree]):
     """Changes stats of files specified in `stat` to those of their overlay
     counter parts.
     """
+    # Group files by directory, so each one is only resolved once
+    directories: Dict[str, List[Tree]] = {}
     for tree in stat:
-        stat = os.stat(tree.props["original_path"], follow_symlinks=False)
-        if not osp.islink(tree):
-            os.chmod(tree, stat.st_mode)
-            os.chown(tree, stat.st_uid, stat.st_gid)
-        else:
-            if os.chmod in os.supports_follow_symlinks:
-                os.chmod(tree, stat.st_mode, follow_symlinks=False)
-            if os.chown in os.supports_follow_symlinks:
-                os.chown(tree, stat.st_uid, stat.st_gid, follow_symlinks=False)
+        directories.setdefault(osp.dirname(tree.path), []).append(tree)
+
+    for directory, trees in directories.items():
+        with util.open_dir(directory) as dir_fd:
+            for tree in trees:
+                name = osp.basename(tree.path)
+                stat = os.stat(
+                    tree.props["original_path"], follow_symlinks=False
+                )
+                current = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+                is_link = S_ISLNK(current.st_mode)
+                # Skip calls that would not change anything
+                chmod = S_IMODE(current.st_mode) != S_IMODE(stat.st_mode)
+                chown = (
+                    (current.st_uid, current.st_gid)
+                    != (stat.st_uid, stat.st_gid)
+                )
+                if chmod and (not is_link or CHMOD_SYMLINKS):
+                    os.chmod(
+                        name, stat.st_mode,
+                        dir_fd=dir_fd, follow_symlinks=not is_link
+                    )
+                if chown and (not is_link or CHOWN_SYMLINKS):
+                    os.chown(
+                        name, stat.st_uid, stat.st_gid,
+                        dir_fd=dir_fd, follow_symlinks=not is_link
+                    )
 
 
 def main():
@@ -509,6 +630,11 @@ def main():
 
     module = setup_module()
 
+    # Normalize paths once, so they can be compared lexically
+    for key in ("base_dir", "overlay_dir", "backup_dir"):
+        if module.params[key]:
+            module.params[key] = osp.abspath(module.params[key])
+
     # Postfix backup path with current timestamp
     if module.params["backup_dir"]:
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -536,25 +662,35 @@ def main():
         module.fail_json(msg=f"Error occured: {str(error)}", **result)
 
     # Mark tree properties
-    mark_symlinked(translation)
+    mark_existing(translation)
     mark_overlaid(translation, relative_links=relative_links)
-    mark_broken(translation, overlay=overlay)
-    mark_conflicting(translation)
-    mark_collapsed(translation)
-    mark_collapsible(translation, replace=replace, overlay=overlay)
+    mark_conflicting(translation, overlay=overlay)
+    mark_collapsible(
+        translation, collapse=collapse, replace=replace, overlay=overlay
+    )
     mark_removable(translation, collapse=collapse, replace=replace)
 
     # Mark planned actions
-    mark_remove(translation)
     mark_link(translation, collapse)
     mark_stat(translation)
 
     # Validate and report planned actions
     validate_conflicts(translation=translation, module=module, result=result)
 
-    remove = translation.filter_children(lambda t: t.props["remove"])
-    link = translation.filter_children(lambda t: t.props["link"])
-    stat = translation.filter_children(lambda t: t.props["stat"])
+    # Collect planned actions in a single walk
+    remove, link, stat = [], [], []
+    for tree in translation.walk_children():
+        if tree.props["remove"]:
+            remove.append(tree)
+        if tree.props["link"]:
+            link.append(tree)
+        if tree.props["stat"]:
+            stat.append(tree)
+
+    # Handle entries of the same directory one after another.
+    # Parents still come before their children.
+    for actions in (remove, link, stat):
+        actions.sort(key=lambda t: t.path)
 
     update_result(
         result=result,
@@ -0,0 +1,44 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+from os import path as osp
+
+from ansible_collections.rcx_one.linkoverlay.plugins.module_utils.\
+    linkoverlay import Tree
+
+
+def make_tree() -> Tree:
+    return Tree("/x/y", [Tree("/x/y/z", [Tree("/x/y/z/w", [], None)], None)],
+                None)
+
+
+@pytest.mark.parametrize("old_base, new_base", [
+    ("/x", "/n"),
+    ("/x/", "/n/"),
+    ("/x/.", "/n"),
+    ("/x/y/..", "/n"),
+    ("/x//", "/n/./"),
+    ("/x/y", "/n"),
+    ("/x", "/"),
+])
+def test_translate_matches_translate_path(old_base, new_base):
+    tree = make_tree()
+    translation = tree.translate(old_base, new_base)
+    assert [t.path for t in translation.walk()] == [
+        osp.normpath(t.translate_path(old_base, new_base))
+        for t in tree.walk()
+    ]
+    assert [t.props["original_path"] for t in translation.walk()] == [
+        t.path for t in tree.walk()
+    ]
+
+
+def test_translate_rejects_children_outside_root():
+    tree = Tree("/x/y", [Tree("/x/other", [], None)], None)
+    with pytest.raises(AssertionError):
+        tree.translate("/x", "/n")
+
+
+def test_props_default():
+    assert Tree("/x", [], None).props == {}